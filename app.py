@@ -14,6 +14,10 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.colors import HexColor, black, white, navy
 
+from formulary import Formulary
+from validation import (check_admission_date, check_dated_lines, check_discharge_date,
+                        check_hospital_course, normalize_medications, normalize_text)
+
 st.set_page_config(page_title="ESIC Pediatrics Discharge Summary", page_icon="🏥", layout="wide")
 
 # Custom CSS
@@ -112,6 +116,62 @@ else:
 # Updated to a model confirmed by your terminal test
 model = genai.GenerativeModel('models/gemini-flash-latest')
 
+# Formulary & diagnosis index - built once per process, shared by all sessions
+@st.cache_resource
+def load_formulary():
+    return Formulary()
+
+formulary = load_formulary()
+
+def add_suggestion(target_key, choice_key, query_key):
+    choice = st.session_state.get(choice_key)
+    if not choice:
+        return
+    lines = st.session_state.get(target_key, "").rstrip().splitlines()
+    # A frequency picked for the presentation just added completes that line
+    if lines and choice.startswith(lines[-1] + " "):
+        lines[-1] = choice
+    else:
+        lines.append(choice)
+    st.session_state[target_key] = "\n".join(lines)
+    # Bare presentation: keep it in the box so the next rerun offers frequencies
+    st.session_state[query_key] = f"{choice} " if formulary.is_presentation(choice) else ""
+
+# Quick-add picker: type a few letters, pick a suggestion, append it as a new line
+def suggestion_picker(target_key, suggest, placeholder):
+    query_key = f"{target_key}_query"
+    choice_key = f"{target_key}_choice"
+    query = st.text_input("🔎 Quick add", placeholder=placeholder, key=query_key)
+    if query.strip():
+        matches = suggest(query)
+        if matches:
+            pick_col, add_col = st.columns([4, 1])
+            with pick_col:
+                st.selectbox("Suggestions", matches, key=choice_key, label_visibility="collapsed")
+            with add_col:
+                st.button("➕ Add", key=f"{target_key}_add", on_click=add_suggestion,
+                          args=(target_key, choice_key, query_key), use_container_width=True)
+        else:
+            st.caption("No match in formulary - type it in the box above")
+
+# Per-field validation - runs on every rerun, errors show under the field and block Generate
+field_errors = {}
+
+def show_field_errors(field, errors):
+    if errors:
+        field_errors[field] = errors
+        for error in errors:
+            st.error(f"⚠️ {error}")
+
+# "Day N" numbering is a weaker signal - flag it but don't block Generate
+def show_field_warnings(warnings):
+    for warning in warnings:
+        st.warning(f"🔎 {warning}")
+
+# Tidy a free-text field as soon as it's entered so the user sees exactly what goes to Gemini
+def normalize_field(key, normalize=normalize_text):
+    st.session_state[key] = normalize(st.session_state[key])
+
 
 # Main title with proper styling
 st.markdown("""
@@ -176,6 +236,7 @@ with tab1:
             key="unit_select"
         )
         admission_date = st.date_input("📆 Admission Date *", key="admission_date")
+        show_field_errors("Admission Date", check_admission_date(admission_date))
         
     with col3:
         consultant_name = st.text_input("👨‍⚕️ Consultant *", key="consultant_input")
@@ -183,7 +244,9 @@ with tab1:
         discharge_date = st.date_input("📆 Discharge Date *", key="discharge_date")
         discharge_time = st.time_input("⏰ Discharge Time", value=datetime.now().time(), key="discharge_time")
     
-    if admission_date and discharge_date:
+    stay_errors = check_discharge_date(admission_date, discharge_date)
+    show_field_errors("Discharge Date", stay_errors)
+    if admission_date and discharge_date and not stay_errors:
         duration_of_stay = (discharge_date - admission_date).days
         st.info(f"📊 Duration of Stay: {duration_of_stay} days")
         st.markdown("---")
@@ -191,13 +254,18 @@ with tab1:
     st.subheader("📏 Anthropometry")
     a_col1, a_col2, a_col3 = st.columns(3)
     with a_col1:
-        weight = st.text_input("Weight (kg)", placeholder="e.g. 10kg (50th centile)")
-        height = st.text_input("Height/Length (cm)", placeholder="e.g. 75cm")
+        weight = st.text_input("Weight (kg)", placeholder="e.g. 10kg (50th centile)", key="weight_input",
+                               on_change=normalize_field, args=("weight_input",))
+        height = st.text_input("Height/Length (cm)", placeholder="e.g. 75cm", key="height_input",
+                               on_change=normalize_field, args=("height_input",))
     with a_col2:
-        hc = st.text_input("HC (cm)", placeholder="Head Circumference")
-        muac = st.text_input("MUAC (cm)")
+        hc = st.text_input("HC (cm)", placeholder="Head Circumference", key="hc_input",
+                           on_change=normalize_field, args=("hc_input",))
+        muac = st.text_input("MUAC (cm)", key="muac_input",
+                             on_change=normalize_field, args=("muac_input",))
     with a_col3:
-        wfh = st.text_input("WFH", placeholder="Weight for Height")
+        wfh = st.text_input("WFH", placeholder="Weight for Height", key="wfh_input",
+                            on_change=normalize_field, args=("wfh_input",))
     
     anthro_summary = f"Weight: {weight}, Height: {height}, HC: {hc}, MUAC: {muac}, WFH: {wfh}"
 
@@ -206,7 +274,7 @@ with tab2:
 
     # NEW: Presenting Complaints (Full width at the top)
     st.subheader("🚩 Presenting Complaints *")
-    presenting_complaints = st.text_area("", placeholder="Enter the symptoms that brought the patient to the hospital...", height=100, key="presenting_complaints_area")
+    presenting_complaints = st.text_area("", placeholder="Enter the symptoms that brought the patient to the hospital...", height=100, key="presenting_complaints_area", on_change=normalize_field, args=("presenting_complaints_area",))
     
     st.markdown("---")
     
@@ -214,15 +282,17 @@ with tab2:
     col_diag1, col_diag2 = st.columns(2)
     with col_diag1:
         st.subheader("📌 Admitting Diagnosis *")
-        admitting_diagnosis = st.text_area("", height=100, key="admitting_diagnosis_area")
+        admitting_diagnosis = st.text_area("", height=100, key="admitting_diagnosis_area", on_change=normalize_field, args=("admitting_diagnosis_area",))
+        suggestion_picker("admitting_diagnosis_area", formulary.suggest_diagnoses, "e.g. pneu, J18, feb seiz")
         st.subheader("📌 Comorbidities")
-        comorbidities = st.text_area("", height=60, key="comorbidities_area")
+        comorbidities = st.text_area("", height=60, key="comorbidities_area", on_change=normalize_field, args=("comorbidities_area",))
 
     with col_diag2:
         st.subheader("✅ Discharge Diagnosis *")
-        discharge_diagnosis = st.text_area("", height=100, key="discharge_diagnosis_area")
+        discharge_diagnosis = st.text_area("", height=100, key="discharge_diagnosis_area", on_change=normalize_field, args=("discharge_diagnosis_area",))
+        suggestion_picker("discharge_diagnosis_area", formulary.suggest_diagnoses, "e.g. pneu, J18, feb seiz")
         st.subheader("📌 Complications")
-        complications = st.text_area("", height=60, key="complications_area")
+        complications = st.text_area("", height=60, key="complications_area", on_change=normalize_field, args=("complications_area",))
 
     st.markdown("---")
     
@@ -236,16 +306,22 @@ with tab2:
             "Enter investigations with dates and results:",
             placeholder="Hb: 11.2 g/dL (12/03/2026)\nTLC: 15,200 cells/mm³ (12/03/2026)\nCRP: 120 mg/L (12/03/2026)",
             height=150,
-            key="blood_investigations_area"
+            key="blood_investigations_area",
+            on_change=normalize_field,
+            args=("blood_investigations_area",)
         )
+        show_field_errors("Blood Investigations", check_dated_lines(blood_investigations, discharge_date))
         
         st.markdown("### 📊 Imaging Studies")
         imaging_investigations = st.text_area(
             "Enter imaging reports:",
             placeholder="Chest X-ray: LLL consolidation (12/03/2026)\nUSG Abdomen: Normal (13/03/2026)",
             height=150,
-            key="imaging_investigations_area"
+            key="imaging_investigations_area",
+            on_change=normalize_field,
+            args=("imaging_investigations_area",)
         )
+        show_field_errors("Imaging Studies", check_dated_lines(imaging_investigations, discharge_date))
         
     with inv_col2:
         st.markdown("### 🧪 Other Investigations")
@@ -253,15 +329,20 @@ with tab2:
             "Enter other tests:",
             placeholder="Urine Culture: No growth (13/03/2026)\nCSF Analysis: Normal (14/03/2026)",
             height=150,
-            key="other_investigations_area"
+            key="other_investigations_area",
+            on_change=normalize_field,
+            args=("other_investigations_area",)
         )
+        show_field_errors("Other Investigations", check_dated_lines(other_investigations, discharge_date))
         
         st.markdown("### 📈 Vital Signs")
         vitals_trend = st.text_area(
             "Enter vital signs:",
             placeholder="BP: 110/70 mmHg\nHR: 88 bpm\nTemp: 98.6°F\nSpO2: 98%",
             height=150,
-            key="vitals_trend_area"
+            key="vitals_trend_area",
+            on_change=normalize_field,
+            args=("vitals_trend_area",)
         )
     
     st.markdown("---")
@@ -271,8 +352,12 @@ with tab2:
         "Day-wise summary:",
         placeholder="Day 1: Admitted with fever, started on IV antibiotics\nDay 2: Improved, afebrile\nDay 3: Stable, shifted to oral\nDay 4: Discharged",
         height=150,
-        key="hospital_course_area"
+        key="hospital_course_area",
+        on_change=normalize_field,
+        args=("hospital_course_area",)
     )
+    show_field_errors("Clinical Course", check_dated_lines(hospital_course, discharge_date, earliest=admission_date))
+    show_field_warnings(check_hospital_course(hospital_course, admission_date, discharge_date))
 
 with tab3:
     st.header("💊 Discharge Planning")
@@ -285,16 +370,22 @@ with tab3:
             "Medications with dosage:",
             placeholder="Amoxicillin 250mg/5ml - 10ml TID x7d\nParacetamol 250mg/5ml - 10ml SOS",
             height=150,
-            key="discharge_medications_area"
+            key="discharge_medications_area",
+            on_change=normalize_field,
+            args=("discharge_medications_area", normalize_medications)
         )
+        suggestion_picker("discharge_medications_area", formulary.suggest_medications, "e.g. amox, then add dose & frequency")
         
         st.subheader("💉 IV Medications")
         iv_medications = st.text_area(
             "IV medications given:",
             placeholder="Ceftriaxone 500mg IV BD x3d\nIV Fluids RL",
             height=100,
-            key="iv_medications_area"
+            key="iv_medications_area",
+            on_change=normalize_field,
+            args=("iv_medications_area", normalize_medications)
         )
+        suggestion_picker("iv_medications_area", formulary.suggest_medications, "e.g. ceftr, then add dose & frequency")
         
     with col_med2:
         st.subheader("📅 Follow-up Plan *")
@@ -302,15 +393,20 @@ with tab3:
             "Follow-up appointments:",
             placeholder="OPD: 23/03/2026\nVaccination: MMR due\nRepeat CBC: 23/03/2026",
             height=150,
-            key="follow_up_area"
+            key="follow_up_area",
+            on_change=normalize_field,
+            args=("follow_up_area",)
         )
+        show_field_errors("Follow-up Plan", check_dated_lines(follow_up, discharge_date, follow_up=True))
         
         st.subheader("⚠️ Special Instructions")
         special_instructions = st.text_area(
             "Diet, activity, precautions:",
             placeholder="Soft diet, plenty of fluids\nNo school for 1 week\nReport if fever recurs",
             height=150,
-            key="special_instructions_area"
+            key="special_instructions_area",
+            on_change=normalize_field,
+            args=("special_instructions_area",)
         )
     
     st.markdown("---")
@@ -330,7 +426,9 @@ with tab3:
             "Brief discharge advice:",
             placeholder="Patient discharged in stable condition. Complete antibiotic course, follow up in OPD.",
             height=100,
-            key="discharge_advice_area"
+            key="discharge_advice_area",
+            on_change=normalize_field,
+            args=("discharge_advice_area",)
         )
 
 import os
@@ -548,6 +646,8 @@ if generate_btn:
                 admitting_diagnosis, discharge_diagnosis, hospital_course, 
                 discharge_medications, follow_up, discharge_condition]):
         st.error("⚠️ Please fill in all * marked required fields")
+    elif field_errors:
+        st.error(f"⚠️ Please correct the highlighted fields: {', '.join(field_errors)}")
     else:
         with st.spinner("🧠 Gemini AI is generating official ESIC discharge summary..."):
             try:
@@ -611,6 +711,10 @@ SIGNATURE OF THE CONSULTANT             SIGNATURE OF THE RESIDENT
                 # Extract text directly from Gemini response
                 summary = response.text
                 
+                # Rank future suggestions by what this department actually prescribes
+                formulary.record_usage(medications="\n".join([discharge_medications, iv_medications]),
+                                       diagnoses="\n".join([admitting_diagnosis, discharge_diagnosis]))
+                
                 # ... rest of your display and download code ...
                 
                 # Display summary
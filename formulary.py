@@ -0,0 +1,358 @@
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+
+# Local formulary and diagnosis index used by the quick-add pickers in app.py.
+# Everything here is plain Python so it loads once per process and answers
+# suggestions without any network call.
+
+USAGE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "formulary_usage.json")
+
+# (drug name, [(strength, route), ...]) - common pediatric presentations
+DRUGS = [
+    ("Amoxicillin", [("125mg/5ml", "PO"), ("250mg/5ml", "PO"), ("500mg", "PO")]),
+    ("Amoxicillin-Clavulanate", [("228.5mg/5ml", "PO"), ("457mg/5ml", "PO"), ("375mg", "PO")]),
+    ("Azithromycin", [("100mg/5ml", "PO"), ("200mg/5ml", "PO"), ("250mg", "PO")]),
+    ("Cefixime", [("50mg/5ml", "PO"), ("100mg/5ml", "PO"), ("200mg", "PO")]),
+    ("Cefpodoxime", [("50mg/5ml", "PO"), ("100mg", "PO")]),
+    ("Cephalexin", [("125mg/5ml", "PO"), ("250mg", "PO")]),
+    ("Ceftriaxone", [("250mg", "IV"), ("500mg", "IV"), ("1g", "IV")]),
+    ("Cefotaxime", [("250mg", "IV"), ("500mg", "IV"), ("1g", "IV")]),
+    ("Ampicillin", [("250mg", "IV"), ("500mg", "IV")]),
+    ("Gentamicin", [("20mg/2ml", "IV"), ("80mg/2ml", "IV")]),
+    ("Amikacin", [("100mg/2ml", "IV"), ("250mg/2ml", "IV")]),
+    ("Vancomycin", [("500mg", "IV")]),
+    ("Meropenem", [("500mg", "IV"), ("1g", "IV")]),
+    ("Piperacillin-Tazobactam", [("2.25g", "IV"), ("4.5g", "IV")]),
+    ("Metronidazole", [("100mg/5ml", "PO"), ("500mg/100ml", "IV")]),
+    ("Cotrimoxazole", [("40/200mg per 5ml", "PO")]),
+    ("Acyclovir", [("200mg/5ml", "PO"), ("250mg", "IV")]),
+    ("Fluconazole", [("50mg/5ml", "PO"), ("200mg/100ml", "IV")]),
+    ("Paracetamol", [("120mg/5ml", "PO"), ("250mg/5ml", "PO"), ("500mg", "PO"), ("150mg/ml", "IV"), ("80mg", "PR")]),
+    ("Ibuprofen", [("100mg/5ml", "PO"), ("200mg", "PO")]),
+    ("Ondansetron", [("2mg/5ml", "PO"), ("2mg/ml", "IV")]),
+    ("Domperidone", [("1mg/ml", "PO")]),
+    ("Ranitidine", [("75mg/5ml", "PO"), ("25mg/ml", "IV")]),
+    ("Pantoprazole", [("40mg", "IV"), ("20mg", "PO")]),
+    ("ORS", [("WHO low osmolarity", "PO")]),
+    ("Zinc", [("20mg/5ml", "PO"), ("10mg", "PO")]),
+    ("Salbutamol", [("2mg/5ml", "PO"), ("2.5mg/2.5ml", "NEB"), ("100mcg", "MDI")]),
+    ("Levosalbutamol", [("0.63mg/2.5ml", "NEB"), ("1mg/5ml", "PO")]),
+    ("Ipratropium", [("250mcg/2ml", "NEB")]),
+    ("Budesonide", [("0.5mg/2ml", "NEB"), ("200mcg", "MDI")]),
+    ("Prednisolone", [("5mg/5ml", "PO"), ("5mg", "PO")]),
+    ("Dexamethasone", [("4mg/ml", "IV"), ("0.5mg", "PO")]),
+    ("Hydrocortisone", [("100mg", "IV")]),
+    ("Montelukast", [("4mg", "PO"), ("5mg", "PO")]),
+    ("Cetirizine", [("5mg/5ml", "PO"), ("10mg", "PO")]),
+    ("Chlorpheniramine", [("2mg/5ml", "PO")]),
+    ("Phenobarbitone", [("20mg/5ml", "PO"), ("200mg/ml", "IV")]),
+    ("Levetiracetam", [("100mg/ml", "PO"), ("500mg/5ml", "IV")]),
+    ("Sodium Valproate", [("200mg/5ml", "PO")]),
+    ("Phenytoin", [("30mg/5ml", "PO"), ("50mg/ml", "IV")]),
+    ("Midazolam", [("1mg/ml", "IV"), ("5mg/ml", "IN")]),
+    ("Iron", [("Ferrous sulphate 25mg/ml elemental", "PO")]),
+    ("Folic Acid", [("5mg", "PO")]),
+    ("Vitamin D3", [("400IU/ml", "PO"), ("60000IU", "PO")]),
+    ("Multivitamin", [("5ml", "PO")]),
+    ("Calcium", [("250mg/5ml", "PO")]),
+    ("Lactulose", [("10g/15ml", "PO")]),
+    ("Furosemide", [("10mg/ml", "IV"), ("10mg/ml", "PO")]),
+    ("Spironolactone", [("25mg", "PO")]),
+    ("Vitamin K", [("1mg/0.5ml", "IM")]),
+    ("Artesunate", [("60mg", "IV")]),
+    ("Albendazole", [("200mg/5ml", "PO"), ("400mg", "PO")]),
+    ("Mupirocin", [("2%", "TOP")]),
+    ("Permethrin", [("5%", "TOP")]),
+    # The route is already in the name, so none is stored for IV fluids
+    ("IV Fluids RL", [("", "")]),
+    ("IV Fluids NS", [("", "")]),
+    ("IV Fluids D5 1/2NS", [("", "")]),
+]
+
+FREQUENCIES = ["OD", "BD", "TID", "QID", "Q4H", "Q6H", "Q8H", "Q12H", "HS", "SOS", "STAT"]
+
+# ICD-10 style diagnoses commonly seen on the pediatric wards
+DIAGNOSES = [
+    ("J18.9", "Pneumonia, unspecified organism"),
+    ("J15.9", "Bacterial pneumonia"),
+    ("J21.9", "Acute bronchiolitis"),
+    ("J45.9", "Bronchial asthma"),
+    ("J46", "Acute severe asthma"),
+    ("J06.9", "Acute upper respiratory tract infection"),
+    ("J03.9", "Acute tonsillitis"),
+    ("J05.0", "Croup (acute obstructive laryngitis)"),
+    ("H66.9", "Acute otitis media"),
+    ("A09", "Acute gastroenteritis"),
+    ("E86.0", "Dehydration"),
+    ("A01.0", "Typhoid fever (enteric fever)"),
+    ("A90", "Dengue fever"),
+    ("A91", "Dengue haemorrhagic fever"),
+    ("B54", "Malaria, unspecified"),
+    ("A75.3", "Scrub typhus"),
+    ("B01.9", "Varicella (chickenpox)"),
+    ("B05.9", "Measles"),
+    ("B26.9", "Mumps"),
+    ("A37.9", "Pertussis"),
+    ("A15.9", "Pulmonary tuberculosis"),
+    ("G03.9", "Meningitis, unspecified"),
+    ("G00.9", "Bacterial meningitis"),
+    ("G04.9", "Acute encephalitis"),
+    ("R56.0", "Simple febrile seizure"),
+    ("G40.9", "Epilepsy, unspecified"),
+    ("G41.9", "Status epilepticus"),
+    ("N39.0", "Urinary tract infection"),
+    ("N04.9", "Nephrotic syndrome"),
+    ("N05.9", "Acute glomerulonephritis"),
+    ("A41.9", "Sepsis, unspecified organism"),
+    ("P36.9", "Neonatal sepsis"),
+    ("P59.9", "Neonatal jaundice"),
+    ("P22.0", "Respiratory distress syndrome of newborn"),
+    ("P07.3", "Preterm newborn"),
+    ("P05.9", "Small for gestational age"),
+    ("P21.9", "Birth asphyxia"),
+    ("D50.9", "Iron deficiency anaemia"),
+    ("D57.1", "Sickle cell disease"),
+    ("D56.1", "Beta thalassaemia major"),
+    ("D69.3", "Immune thrombocytopenic purpura"),
+    ("E43", "Severe acute malnutrition"),
+    ("E44.0", "Moderate acute malnutrition"),
+    ("E10.1", "Type 1 diabetes mellitus with ketoacidosis"),
+    ("E03.9", "Hypothyroidism"),
+    ("K35.8", "Acute appendicitis"),
+    ("K59.0", "Constipation"),
+    ("K72.0", "Acute liver failure"),
+    ("B15.9", "Hepatitis A"),
+    ("I00", "Acute rheumatic fever"),
+    ("I30.9", "Acute pericarditis"),
+    ("Q21.1", "Atrial septal defect"),
+    ("Q21.0", "Ventricular septal defect"),
+    ("M30.3", "Kawasaki disease"),
+    ("L01.0", "Impetigo"),
+    ("L03.9", "Cellulitis"),
+    ("B86", "Scabies"),
+    ("T78.3", "Angioedema"),
+    ("T63.0", "Snake bite envenomation"),
+    ("T65.9", "Poisoning, unspecified substance"),
+]
+
+# Starting ranks before the department has logged any of its own usage
+DEFAULT_WEIGHTS = {
+    "Paracetamol": 50, "Amoxicillin": 30, "Ceftriaxone": 30, "ORS": 25, "Zinc": 25,
+    "Salbutamol": 20, "Azithromycin": 15, "Cefixime": 15, "Ondansetron": 15,
+    "IV Fluids RL": 15, "Iron": 10, "Vitamin D3": 10, "Prednisolone": 10,
+    "J18.9": 30, "J21.9": 25, "A09": 25, "R56.0": 20, "J45.9": 15, "P59.9": 15,
+    "A90": 15, "N39.0": 10, "P36.9": 10, "J06.9": 10, "E86.0": 10,
+    # Presentations: syrups ahead of tablets on a pediatric ward
+    "Paracetamol 250mg/5ml PO": 10, "Paracetamol 120mg/5ml PO": 5,
+    "Amoxicillin 250mg/5ml PO": 10, "Amoxicillin 125mg/5ml PO": 5,
+    "Azithromycin 200mg/5ml PO": 5, "Cefixime 100mg/5ml PO": 5,
+    "Ceftriaxone 500mg IV": 5, "Salbutamol 2.5mg/2.5ml NEB": 5,
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9.%/-]+")
+# Words inside a token: "amoxicillin-clavulanate" is also found by "clav"
+PART_RE = re.compile(r"[a-z0-9.%/]+")
+
+
+def _ngrams(text, n=3):
+    padded = f"  {text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def _mention(term):
+    # A whole-term match: not part of a longer word, number, code or hyphenated name
+    return re.compile(rf"(?<![\w./-]){re.escape(term.lower())}(?![\w./-])")
+
+
+class SuggestionIndex:
+    """Prefix trie plus trigram index over a fixed set of labels.
+
+    Every word start of a label is inserted into the trie, so "pneu" finds
+    "Bacterial pneumonia" as well as "Pneumonia, unspecified", "feb seiz"
+    finds "Simple febrile seizure" and "clav" finds "Amoxicillin-Clavulanate".
+    The trigram index is only consulted when the trie can't fill the list,
+    which is what catches typos such as "amoxycilin" or "pnuemonia".
+    """
+
+    def __init__(self, entries):
+        # entries: list of (label, usage_key) - ranked by the key's usage
+        # (drug name / ICD code), then by the label's own usage
+        self.labels = []
+        self.keys = []
+        self.trie = {}
+        self.grams = defaultdict(set)
+        for label, key in entries:
+            self._add(label, key)
+
+    def _add(self, label, key):
+        idx = len(self.labels)
+        self.labels.append(label)
+        self.keys.append(key)
+        text = label.lower()
+        words = list(PART_RE.finditer(text))
+        for match in words:
+            node = self.trie
+            for ch in text[match.start():]:
+                node = node.setdefault(ch, {})
+                node.setdefault("$", set()).add(idx)
+        # Trigrams per word, so a typo is scored against the word it misspells
+        for number, match in enumerate(words):
+            for gram in _ngrams(match.group(0)):
+                self.grams[gram].add((idx, number))
+
+    def prefix(self, query):
+        node = self.trie
+        for ch in query.lower():
+            node = node.get(ch)
+            if node is None:
+                return set()
+        return node.get("$", set())
+
+    def words(self, query):
+        # Every word of the query has to start some word of the label
+        found = None
+        for word in TOKEN_RE.findall(query.lower()):
+            found = self.prefix(word) if found is None else found & self.prefix(word)
+            if not found:
+                return set()
+        return found or set()
+
+    def fuzzy(self, query, min_score=0.5):
+        # For each query word, the share of its trigrams found in the
+        # best-matching word of the label; averaged over the query words
+        words = PART_RE.findall(query.lower())
+        scores = defaultdict(float)
+        for word in words:
+            grams = _ngrams(word)
+            hits = defaultdict(int)
+            for gram in grams:
+                for idx_word in self.grams.get(gram, ()):
+                    hits[idx_word] += 1
+            best = defaultdict(int)
+            for (idx, _), shared in hits.items():
+                best[idx] = max(best[idx], shared)
+            for idx, shared in best.items():
+                scores[idx] += shared / len(grams) / len(words)
+        return {idx: score for idx, score in scores.items() if score >= min_score}
+
+    def search(self, query, weights, limit=8):
+        query = " ".join(query.split())
+        if not query:
+            return []
+        rank = lambda idx: (-weights.get(self.keys[idx], 0), -weights.get(self.labels[idx], 0),
+                            len(self.labels[idx]), self.labels[idx])
+        matches = sorted(self.prefix(query) | self.words(query), key=rank)[:limit]
+        if len(matches) < limit:
+            seen = set(matches)
+            fuzzy = self.fuzzy(query)
+            extra = sorted((i for i in fuzzy if i not in seen),
+                           key=lambda idx: (-fuzzy[idx],) + rank(idx))
+            matches.extend(extra[:limit - len(matches)])
+        return [self.labels[idx] for idx in matches]
+
+
+class Formulary:
+    """Drug and diagnosis suggestions ranked by department usage."""
+
+    def __init__(self, usage_path=None):
+        self.usage_path = usage_path or USAGE_FILE
+        self.usage = dict(DEFAULT_WEIGHTS)
+        self.lock = threading.Lock()
+        self._load_usage()
+
+        drug_entries = []
+        self.presentations = {}
+        self.drug_patterns = []
+        # Longest names first, so "Amoxicillin-Clavulanate" isn't also counted as "Amoxicillin"
+        for name, forms in sorted(DRUGS, key=lambda drug: -len(drug[0])):
+            strengths = []
+            for strength, route in forms:
+                label = " ".join(part for part in (name, strength, route) if part)
+                drug_entries.append((label, name))
+                self.presentations[label.lower()] = label
+                if strength:
+                    strengths.append((_mention(strength), _mention(route), label))
+            strengths.sort(key=lambda form: -len(form[0].pattern))
+            self.drug_patterns.append((name, _mention(name), strengths))
+        self.diagnosis_patterns = [(code, _mention(code), _mention(name)) for code, name in DIAGNOSES]
+        self.drugs = SuggestionIndex(drug_entries)
+        self.diagnoses = SuggestionIndex(
+            [(f"{code} {name}", code) for code, name in DIAGNOSES]
+        )
+
+    def _load_usage(self):
+        if not os.path.exists(self.usage_path):
+            return
+        try:
+            with open(self.usage_path) as f:
+                for key, count in json.load(f).items():
+                    self.usage[key] = self.usage.get(key, 0) + int(count)
+        except (OSError, ValueError):
+            pass
+
+    def suggest_medications(self, query, limit=8):
+        """Suggest drug presentations, then frequencies once one is typed out."""
+        # Keep a trailing space: "Amoxicillin 250mg/5ml PO " asks for frequencies
+        query = " ".join(query.split()) + (" " if query[-1:].isspace() else "")
+        lowered = query.lower()
+        # Once a full "name strength route" is typed, offer the frequency
+        for key, label in self.presentations.items():
+            if lowered.startswith(key + " "):
+                typed = query[len(key) + 1:]
+                head = query[:len(key) + 1]
+                last = typed.split(" ")[-1].upper()
+                rest = typed[:len(typed) - len(last)]
+                # Most used frequency for this presentation first
+                freqs = sorted((freq for freq in FREQUENCIES if freq.startswith(last)),
+                               key=lambda freq: -self.usage.get(f"{label} {freq}", 0))
+                return [head + rest + freq for freq in freqs][:limit]
+        return self.drugs.search(query, self.usage, limit)
+
+    def is_presentation(self, text):
+        return text.strip().lower() in self.presentations
+
+    def suggest_diagnoses(self, query, limit=8):
+        return self.diagnoses.search(query, self.usage, limit)
+
+    def record_usage(self, medications="", diagnoses=""):
+        """Bump usage for the drugs, presentations, frequencies and diagnoses mentioned."""
+        used = set()
+        for line in medications.lower().splitlines():
+            for name, name_re, strengths in self.drug_patterns:
+                match = name_re.search(line)
+                if not match:
+                    continue
+                used.add(name)
+                # Blank the name out so shorter names inside it aren't matched again
+                line = line[:match.start()] + " " * len(match.group(0)) + line[match.end():]
+                forms = [form for form in strengths if form[0].search(line)]
+                if forms:
+                    # Same strength in two routes: prefer the route written on the line
+                    label = next((label for _, route_re, label in forms if route_re.search(line)), forms[0][2])
+                    used.add(label)
+                    used.update(f"{label} {freq}" for freq in FREQUENCIES if _mention(freq).search(line))
+        lowered = diagnoses.lower()
+        used.update(code for code, code_re, name_re in self.diagnosis_patterns
+                    if code_re.search(lowered) or name_re.search(lowered))
+        if not used:
+            return
+        with self.lock:
+            for key in used:
+                self.usage[key] = self.usage.get(key, 0) + 1
+            counts = {}
+            if os.path.exists(self.usage_path):
+                try:
+                    with open(self.usage_path) as f:
+                        counts = json.load(f)
+                except (OSError, ValueError):
+                    counts = {}
+            for key in used:
+                counts[key] = counts.get(key, 0) + 1
+            try:
+                with open(self.usage_path, "w") as f:
+                    json.dump(counts, f, indent=1, sort_keys=True)
+            except OSError:
+                pass
@@ -0,0 +1,403 @@
+"""Multi-session load test for app.py.
+
+Drives the real app script through Streamlit's headless AppTest API with N
+concurrent sessions. Each session fills the three tabs the way a resident
+would (one rerun per field), presses Generate against a fake Gemini model
+with configurable latency, and downloads the TXT, PDF and Word files.
+
+    python load_test.py --sessions 20 --latency 4 --jitter 1 --output report.json
+
+The JSON report has rerun latency percentiles, generation queueing,
+throughput and memory, so runs can be compared over time. The exit code is
+1 if any session failed.
+
+The harness patches Streamlit internals to run AppTest sessions side by side,
+so it only supports the Streamlit versions pinned in requirements-dev.txt.
+"""
+
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import random
+import tempfile
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+
+import google.generativeai as genai
+import streamlit as st
+
+import formulary
+
+SUPPORTED_STREAMLIT = "streamlit>=1.66,<1.67 (see requirements-dev.txt)"
+
+try:
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.scriptrunner.script_runner import ScriptRunner
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.testing.v1 import AppTest, app_test
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+    from streamlit.testing.v1.util import patch_config_options
+except ImportError as e:
+    sys.exit(f"load_test.py needs {SUPPORTED_STREAMLIT}, found streamlit {st.__version__}: {e}")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "app.py")
+
+DOWNLOADS = {
+    "txt_download": b"",
+    "pdf_download": b"%PDF",
+    "word_download": b"PK",  # .docx is a zip archive
+}
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel.
+
+    Sleeps for the configured latency, with at most `max_inflight` calls
+    running at once to mimic the API quota. Time spent waiting for a slot is
+    recorded as generation queueing.
+    """
+
+    latency = 3.0
+    jitter = 0.0
+    slots = threading.BoundedSemaphore(4)
+    calls = []
+    calls_lock = threading.Lock()
+
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None):
+        requested = time.perf_counter()
+        with self.slots:
+            started = time.perf_counter()
+            time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+            finished = time.perf_counter()
+        with self.calls_lock:
+            self.calls.append({
+                "queue_ms": (started - requested) * 1000,
+                "model_ms": (finished - started) * 1000,
+            })
+        response = MagicMock()
+        response.text = self._summary(prompt)
+        return response
+
+    @staticmethod
+    def _summary(prompt):
+        # Echo the mandatory structure back, as the real model mostly does
+        body = prompt.split("--- MANDATORY STRUCTURE ---", 1)[-1]
+        return body.split("\n---\n", 1)[0].strip()
+
+
+def shared_runtime():
+    """Build one mock Runtime for every session.
+
+    AppTest installs a fresh mock in the Runtime singleton for each run and
+    clears it afterwards, which breaks as soon as two sessions run at once.
+    A real server also has a single Runtime, so all sessions share this one.
+    The same goes for the "global.appTest" config flag AppTest toggles around
+    each run - main() sets it once for the whole load test instead.
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    components = BidiComponentManager()
+    components.discover_and_register_components(start_file_watching=False)
+    runtime.bidi_component_registry = components
+    return runtime
+
+
+def check_streamlit_internals():
+    """Fail early if the private attributes the harness patches have moved."""
+    missing = []
+    if not hasattr(app_test, "patch_config_options"):
+        missing.append("testing.v1.app_test.patch_config_options")
+    if not hasattr(MediaFileManager(MemoryMediaFileStorage("/mock/media")), "_storage"):
+        missing.append("MediaFileManager._storage")
+    if not hasattr(Secrets(), "_secrets"):
+        missing.append("Secrets._secrets")
+    if "self._session_id = session_id" not in inspect.getsource(ScriptRunner.__init__):
+        missing.append("ScriptRunner._session_id")
+    if missing:
+        sys.exit(f"load_test.py needs {SUPPORTED_STREAMLIT}, found streamlit {st.__version__}; "
+                 f"missing: {', '.join(missing)}")
+
+
+def init_with_session_id(init):
+    """Give each AppTest its own session id.
+
+    Every AppTest runner reports itself as "test session id", so one session's
+    rerun would release the download files of all the others.
+    """
+    def wrapped(self, script_path, session_state, *args, **kwargs):
+        init(self, script_path, session_state, *args, **kwargs)
+        self._session_id = f"load-test-{id(session_state)}"
+    return wrapped
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_mb()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.peak = max(self.peak, rss_mb())
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 2),
+        "p50": round(pick(0.50), 2),
+        "p90": round(pick(0.90), 2),
+        "p95": round(pick(0.95), 2),
+        "p99": round(pick(0.99), 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def fill_steps(n):
+    """One (widget lookup, value[, quick-add clicks]) per field a resident
+    would fill in. Quick-add steps type into a picker's search box and then
+    press its "Add" button that many times - the second click picks a
+    frequency for the presentation the first one added."""
+    admitted = date.today() - timedelta(days=4)
+    return [
+        # Patient Details
+        (lambda at: at.text_input(key="patient_name_input"), f"Load Test Patient {n}"),
+        (lambda at: at.number_input(key="age_years_input"), 3),
+        (lambda at: at.selectbox(key="gender_select"), "Male"),
+        (lambda at: at.text_input(key="patient_id_input"), f"IP{100000 + n}"),
+        (lambda at: at.selectbox(key="unit_select"), "Unit 1"),
+        (lambda at: at.date_input(key="admission_date"), admitted),
+        (lambda at: at.text_input(key="consultant_input"), "Dr. Consultant"),
+        (lambda at: at.text_input(key="resident_input"), "Dr. Resident"),
+        (lambda at: at.date_input(key="discharge_date"), date.today()),
+        (lambda at: at.text_input(key="weight_input"), "14kg"),
+        (lambda at: at.text_input(key="height_input"), "95cm"),
+        # Clinical Data
+        (lambda at: at.text_area(key="presenting_complaints_area"), "Fever and cough for 3 days"),
+        (lambda at: at.text_input(key="admitting_diagnosis_area_query"), "pneu", 1),
+        (lambda at: at.text_area(key="discharge_diagnosis_area"), "J18.9 Pneumonia, unspecified organism"),
+        (lambda at: at.text_area(key="blood_investigations_area"),
+         f"Hb: 11.2 g/dL ({admitted:%d/%m/%Y})\nCRP: 48 mg/L ({admitted:%d/%m/%Y})"),
+        (lambda at: at.text_area(key="imaging_investigations_area"),
+         f"Chest X-ray: RLL consolidation ({admitted:%d/%m/%Y})"),
+        (lambda at: at.text_area(key="hospital_course_area"),
+         "Day 1: Admitted, started IV Ceftriaxone\nDay 3: Afebrile\nDay 5: Discharged"),
+        # Discharge Planning
+        (lambda at: at.text_input(key="discharge_medications_area_query"), "amox", 2),
+        (lambda at: at.text_area(key="iv_medications_area"), "Ceftriaxone 500mg IV BD x3d"),
+        (lambda at: at.text_area(key="follow_up_area"), "OPD review after 1 week"),
+        (lambda at: at.selectbox(key="discharge_condition_select"), "Improved"),
+        (lambda at: at.text_area(key="discharge_advice_area"), "Complete antibiotic course"),
+    ]
+
+
+def run_session(n, args, storage, start_gate):
+    result = {"session": n, "reruns_ms": [], "generate_ms": None, "downloads": {}, "error": None}
+    timeout = args.latency * 4 + args.jitter * 4 + 60
+
+    def rerun(action):
+        started = time.perf_counter()
+        action.run(timeout=timeout)
+        elapsed = (time.perf_counter() - started) * 1000
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        return elapsed
+
+    start_gate.wait()
+    time.sleep(args.ramp_up * n / max(1, args.sessions))
+    started = time.perf_counter()
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        result["reruns_ms"].append(rerun(at))
+
+        for find, value, *adds in fill_steps(n):
+            time.sleep(args.think_time)
+            result["reruns_ms"].append(rerun(find(at).set_value(value)))
+            if adds:
+                # Use the quick-add picker like a resident would
+                area = find(at).key.removesuffix("_query")
+                for _ in range(adds[0]):
+                    result["reruns_ms"].append(rerun(at.button(key=f"{area}_add").click()))
+                if not at.text_area(key=area).value:
+                    raise RuntimeError(f"quick add for {value!r} left {area} empty")
+
+        generate = next(b for b in at.button if b.label.startswith("⚕️ GENERATE"))
+        result["generate_ms"] = rerun(generate.click())
+
+        for key, magic in DOWNLOADS.items():
+            button = next((b for b in at.get("download_button") if b.key == key), None)
+            if button is None:
+                raise RuntimeError(f"{key} not rendered after Generate")
+            data = storage.get_file(button.proto.url.rsplit("/", 1)[-1]).content
+            if not data or not data.startswith(magic):
+                raise RuntimeError(f"{key} returned an invalid file")
+            result["downloads"][key] = len(data)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["wall_s"] = time.perf_counter() - started
+    return result
+
+
+def build_report(args, results, wall_s, baseline_mb, peak_mb):
+    ok = [r for r in results if not r["error"]]
+    reruns = [ms for r in results for ms in r["reruns_ms"]]
+    generated = [r["generate_ms"] for r in results if r["generate_ms"] is not None]
+    calls = FakeGenerativeModel.calls
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "latency_s": args.latency,
+            "jitter_s": args.jitter,
+            "max_inflight": args.max_inflight,
+            "ramp_up_s": args.ramp_up,
+            "think_time_s": args.think_time,
+        },
+        "sessions": {
+            "completed": len(ok),
+            "failed": len(results) - len(ok),
+            "errors": sorted({r["error"] for r in results if r["error"]}),
+        },
+        "rerun_ms": percentiles(reruns),
+        "generation": {
+            "rerun_ms": percentiles(generated),
+            "queue_ms": percentiles([c["queue_ms"] for c in calls]),
+            "queue_ms_note": "time waiting for a --max-inflight slot in the fake model, not queueing inside the app",
+            "model_ms": percentiles([c["model_ms"] for c in calls]),
+        },
+        "throughput": {
+            "wall_s": round(wall_s, 2),
+            "reruns_per_s": round(len(reruns) / wall_s, 2),
+            "generations_per_min": round(len(generated) * 60 / wall_s, 2),
+            "sessions_per_min": round(len(ok) * 60 / wall_s, 2),
+        },
+        "memory_mb": {
+            "baseline": round(baseline_mb, 1),
+            "peak": round(peak_mb, 1),
+            "per_session": round((peak_mb - baseline_mb) / max(1, args.sessions), 2),
+        },
+        "download_bytes": {
+            key: percentiles([r["downloads"][key] for r in ok]) for key in DOWNLOADS
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test app.py with concurrent headless sessions")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--latency", type=float, default=3.0, help="mean fake Gemini latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="std-dev of the latency (s)")
+    parser.add_argument("--max-inflight", type=int, default=4, help="Gemini calls allowed at once")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="spread session starts over this many seconds")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between field edits (s)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    check_streamlit_internals()
+    FakeGenerativeModel.latency = args.latency
+    FakeGenerativeModel.jitter = args.jitter
+    FakeGenerativeModel.slots = threading.BoundedSemaphore(max(1, args.max_inflight))
+    FakeGenerativeModel.calls = []
+
+    runtime = shared_runtime()
+    # AppTest compiles app.py afresh on every run; a server compiles it once.
+    # Sharing one cache also avoids concurrent ast.parse calls, which are not
+    # thread-safe on some CPython versions.
+    get_bytecode = ScriptCache().get_bytecode
+    secrets = Secrets()
+    secrets._secrets = {"GEMINI_API_KEY": "load-test"}
+
+    # The app records formulary usage on every Generate - keep it away from the real counts
+    usage_dir = tempfile.TemporaryDirectory(prefix="esic-loadtest-")
+
+    start_gate = threading.Event()
+    cwd = os.getcwd()
+    os.chdir(APP_DIR)  # app.py opens esic_logo.png relative to its folder
+    try:
+        with patch_config_options({"global.appTest": True}), \
+             patch.object(app_test, "patch_config_options", lambda options: contextlib.nullcontext()), \
+             patch.object(Runtime, "instance", classmethod(lambda cls: runtime)), \
+             patch.object(Runtime, "exists", classmethod(lambda cls: True)), \
+             patch.object(ScriptCache, "get_bytecode", lambda self, path: get_bytecode(path)), \
+             patch.object(LocalScriptRunner, "__init__", init_with_session_id(LocalScriptRunner.__init__)), \
+             patch.object(st, "secrets", secrets), \
+             patch.object(formulary, "USAGE_FILE", os.path.join(usage_dir.name, "formulary_usage.json")), \
+             patch.object(genai, "configure", lambda **kwargs: None), \
+             patch.object(genai, "GenerativeModel", FakeGenerativeModel):
+            # Warm-up run so one-off imports and the formulary build aren't
+            # counted against the first sessions
+            AppTest.from_file(APP_PATH, default_timeout=60).run()
+
+            baseline_mb = rss_mb()
+            sampler = MemorySampler()
+            sampler.start()
+            with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+                futures = [pool.submit(run_session, n, args, runtime.media_file_mgr._storage, start_gate)
+                           for n in range(args.sessions)]
+                started = time.perf_counter()
+                start_gate.set()
+                results = [f.result() for f in futures]
+            wall_s = time.perf_counter() - started
+            sampler.stop()
+    finally:
+        os.chdir(cwd)
+        usage_dir.cleanup()
+
+    report = build_report(args, results, wall_s, baseline_mb, sampler.peak)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    print(
+        f"{report['sessions']['completed']}/{args.sessions} sessions ok | "
+        f"rerun p95 {report['rerun_ms'].get('p95')} ms | "
+        f"generate p95 {report['generation']['rerun_ms'].get('p95')} ms | "
+        f"queue p95 {report['generation']['queue_ms'].get('p95')} ms | "
+        f"{report['memory_mb']['per_session']} MB/session",
+        file=sys.stderr,
+    )
+    return 1 if report["sessions"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
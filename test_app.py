@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import google.generativeai as genai
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import formulary
+
+
+@pytest.fixture
+def app(tmp_path):
+    st.cache_resource.clear()
+    with patch.object(formulary, "USAGE_FILE", str(tmp_path / "usage.json")), \
+         patch.object(genai.GenerativeModel, "generate_content") as generate_content:
+        generate_content.return_value.text = "DISCHARGE SUMMARY"
+        at = AppTest.from_file("app.py", default_timeout=30)
+        at.secrets["GEMINI_API_KEY"] = "test"
+        yield at.run(), generate_content
+    st.cache_resource.clear()
+
+
+def fill_record(at, admitted, discharged):
+    at.text_input(key="patient_name_input").set_value("Test Patient")
+    at.number_input(key="age_years_input").set_value(3)
+    at.selectbox(key="gender_select").set_value("Male")
+    at.text_input(key="patient_id_input").set_value("IP100001")
+    at.selectbox(key="unit_select").set_value("Unit 1")
+    at.text_input(key="consultant_input").set_value("Dr. Consultant")
+    at.date_input(key="admission_date").set_value(admitted)
+    at.date_input(key="discharge_date").set_value(discharged)
+    at.text_area(key="presenting_complaints_area").set_value("Fever for 3 days")
+    at.text_area(key="admitting_diagnosis_area").set_value("Pneumonia")
+    at.text_area(key="discharge_diagnosis_area").set_value("Pneumonia")
+    at.text_area(key="hospital_course_area").set_value("Day 1: Admitted\nDay 2: Afebrile")
+    at.text_area(key="discharge_medications_area").set_value("Amoxicillin 250mg/5ml PO TID")
+    at.text_area(key="follow_up_area").set_value("OPD review after 1 week")
+    at.selectbox(key="discharge_condition_select").set_value("Improved")
+    return at.run()
+
+
+def generate(at):
+    return next(b for b in at.button if b.label.startswith("⚕️ GENERATE")).click().run()
+
+
+def test_generate_refused_on_invalid_record(app):
+    at, generate_content = app
+    today = date.today()
+    at = generate(fill_record(at, today - timedelta(days=2), today - timedelta(days=4)))
+    assert not at.exception
+    generate_content.assert_not_called()
+    assert any("Discharge Date" in error.value for error in at.error)
+
+    at.date_input(key="discharge_date").set_value(today)
+    generate(at.run())
+    generate_content.assert_called_once()
+
+
+def test_fields_are_normalized_on_entry(app):
+    at, _ = app
+    at.text_area(key="blood_investigations_area").set_value("  Hb:   11.2 gm/dl \n\n\n CRP 48 MG/L ").run()
+    assert at.text_area(key="blood_investigations_area").value == "Hb: 11.2 g/dL\n\nCRP 48 mg/L"
+    at.text_area(key="discharge_medications_area").set_value("Amoxicillin 250MG/5ML - 10 mls tds").run()
+    assert at.text_area(key="discharge_medications_area").value == "Amoxicillin 250mg/5ml - 10 ml TID"
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from formulary import Formulary
+
+
+@pytest.fixture
+def formulary(tmp_path):
+    return Formulary(usage_path=str(tmp_path / "usage.json"))
+
+
+def test_prefix_and_word_start_lookup(formulary):
+    assert formulary.suggest_diagnoses("feb seiz") == ["R56.0 Simple febrile seizure"]
+    assert "J15.9 Bacterial pneumonia" in formulary.suggest_diagnoses("pneu")
+    assert formulary.suggest_medications("clav")[0].startswith("Amoxicillin-Clavulanate")
+    assert formulary.suggest_medications("tazo")[0].startswith("Piperacillin-Tazobactam")
+
+
+def test_typo_fallback(formulary):
+    assert formulary.suggest_medications("amoxycilin")[0] == "Amoxicillin 250mg/5ml PO"
+    assert formulary.suggest_diagnoses("pnuemonia")[:2] == [
+        "J18.9 Pneumonia, unspecified organism", "J15.9 Bacterial pneumonia",
+    ]
+
+
+def test_iv_fluids_route_not_repeated(formulary):
+    assert formulary.suggest_medications("iv fluids")[:3] == [
+        "IV Fluids RL", "IV Fluids NS", "IV Fluids D5 1/2NS",
+    ]
+
+
+def test_frequencies_after_full_presentation(formulary):
+    assert formulary.suggest_medications("Amoxicillin 250mg/5ml PO ")[:3] == [
+        "Amoxicillin 250mg/5ml PO OD", "Amoxicillin 250mg/5ml PO BD", "Amoxicillin 250mg/5ml PO TID",
+    ]
+    assert formulary.suggest_medications("Amoxicillin 250mg/5ml PO t") == ["Amoxicillin 250mg/5ml PO TID"]
+
+
+def test_usage_ranking(formulary):
+    assert formulary.suggest_medications("amox")[0] == "Amoxicillin 250mg/5ml PO"
+    for _ in range(20):
+        formulary.record_usage(medications="Amoxicillin 500mg PO TID x5d")
+    assert formulary.suggest_medications("amox")[0] == "Amoxicillin 500mg PO"
+    assert formulary.suggest_medications("Amoxicillin 500mg PO ")[0] == "Amoxicillin 500mg PO TID"
+    # Counts are persisted and picked up by the next process
+    reloaded = Formulary(usage_path=formulary.usage_path)
+    assert reloaded.suggest_medications("amox")[0] == "Amoxicillin 500mg PO"
+
+
+def test_record_usage_counts_whole_names_only(formulary):
+    formulary.record_usage(
+        medications="Amoxicillin-Clavulanate 228.5mg/5ml PO BD x7d",
+        diagnoses="D50.9 Iron deficiency anaemia",
+    )
+    with open(formulary.usage_path) as f:
+        assert json.load(f) == {
+            "Amoxicillin-Clavulanate": 1,
+            "Amoxicillin-Clavulanate 228.5mg/5ml PO": 1,
+            "Amoxicillin-Clavulanate 228.5mg/5ml PO BD": 1,
+            "D50.9": 1,
+        }
@@ -0,0 +1,115 @@
+from datetime import date
+
+from validation import (check_admission_date, check_dated_lines, check_discharge_date,
+                        check_hospital_course, normalize_medications, normalize_text)
+
+ADMITTED = date(2026, 3, 12)
+DISCHARGED = date(2026, 3, 16)
+TODAY = date(2026, 3, 20)
+
+
+def test_stay_accepts_ordered_dates():
+    assert check_admission_date(ADMITTED, today=TODAY) == []
+    assert check_discharge_date(ADMITTED, DISCHARGED) == []
+    assert check_discharge_date(ADMITTED, ADMITTED) == []
+
+
+def test_discharge_before_admission():
+    errors = check_discharge_date(DISCHARGED, ADMITTED)
+    assert len(errors) == 1
+    assert "before admission" in errors[0]
+    assert "-4 days" in errors[0]
+
+
+def test_future_admission_is_an_admission_error():
+    assert check_admission_date(date(2026, 4, 1), today=TODAY) == [
+        "Admission date 01/04/2026 is in the future"
+    ]
+    assert check_discharge_date(date(2026, 4, 1), date(2026, 4, 2)) == []
+
+
+def test_valid_dates_pass():
+    text = "Hb: 11.2 g/dL (12/03/2026)\nCRP 48 mg/L 14-03-2026\nUSG 15.03.2026\nCXR 14 March 2026"
+    assert check_dated_lines(text, DISCHARGED) == []
+
+
+def test_impossible_date_is_flagged():
+    assert check_dated_lines("Hb: 11 (31/02/2026)", DISCHARGED) == [
+        "Line 1: '31/02/2026' is not a valid date (use DD/MM/YYYY)"
+    ]
+
+
+def test_date_after_discharge_is_flagged():
+    assert check_dated_lines("\nCRP 20 (18/03/2026)", DISCHARGED) == [
+        "Line 2: 18/03/2026 is after the discharge date"
+    ]
+
+
+def test_clinical_values_are_not_dates():
+    text = "ABG: 7.32/34/88/18\nHb 9.8/10.2/11\nBP: 110/70 mmHg\nTLC 15,200\nGCS 15/15"
+    assert check_dated_lines(text, DISCHARGED) == []
+    assert check_hospital_course(text, ADMITTED, DISCHARGED) == []
+
+
+def test_two_digit_years_are_not_read_as_dates():
+    assert check_dated_lines("Ratio 1/2/26", DISCHARGED) == []
+
+
+def test_follow_up_before_discharge_is_flagged():
+    text = "OPD: 10/03/2026\nRepeat CBC: 23/03/2026"
+    assert check_dated_lines(text, DISCHARGED, follow_up=True) == [
+        "Line 1: follow-up on 10/03/2026 is before the discharge date"
+    ]
+
+
+def test_hospital_course_in_order_passes():
+    text = "Day 1: Admitted\nDay 2: Afebrile\nDay 5: Discharged"
+    assert check_hospital_course(text, ADMITTED, DISCHARGED) == []
+
+
+def test_hospital_course_out_of_order():
+    text = "Day 1: Admitted\nDay 3: Afebrile\nDay 2: Oral antibiotics"
+    assert check_hospital_course(text, ADMITTED, DISCHARGED) == ["Line 3: Day 2 comes after Day 3"]
+
+
+def test_hospital_course_bounds():
+    text = "Day 0: Admitted\nDay 6: Discharged"
+    assert check_hospital_course(text, ADMITTED, DISCHARGED) == [
+        "Line 1: day numbering starts at Day 1",
+        "Line 2: Day 6 is after discharge (stay is 4 days)",
+    ]
+
+
+def test_hospital_course_date_before_admission():
+    assert check_dated_lines("Day 1: seen 10/03/2026", DISCHARGED, earliest=ADMITTED) == [
+        "Line 1: 10/03/2026 is before the admission date"
+    ]
+
+
+def test_normalize_text_whitespace():
+    assert normalize_text("  Hb:   11.2  \n\n\n\n  CRP  48 \n") == "Hb: 11.2\n\nCRP 48"
+
+
+def test_normalize_text_units():
+    assert normalize_text("Hb 11.2 gm/dl, CRP 120 MG/L, Wt 10 KGS, BP 110/70 mmhg") == (
+        "Hb 11.2 g/dL, CRP 120 mg/L, Wt 10 kg, BP 110/70 mmHg"
+    )
+
+
+def test_normalize_text_leaves_words_alone():
+    text = "Mg supplementation, ML lab, CC unit, Dr. Kg Rao, admitted to ICU"
+    assert normalize_text(text) == text
+
+
+def test_normalize_medications_frequencies():
+    assert normalize_medications("Amoxicillin 250MG/5ML - 10 mls tds x7d") == (
+        "Amoxicillin 250mg/5ml - 10 ml TID x7d"
+    )
+    assert normalize_medications("Paracetamol 250mg/5ml 10ml sos\nSalbutamol neb bid") == (
+        "Paracetamol 250mg/5ml 10ml SOS\nSalbutamol neb BD"
+    )
+
+
+def test_normalize_medications_leaves_words_alone():
+    text = "Iron drops, continue at home, odd days only"
+    assert normalize_medications(text) == text
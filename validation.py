@@ -0,0 +1,124 @@
+import re
+from datetime import date
+
+from formulary import FREQUENCIES
+
+# Per-field checks and clean-up run on every rerun, before anything is sent to
+# Gemini. Each check returns a list of messages for one field (empty = OK).
+# app.py blocks Generate on the date checks; check_hospital_course only reads
+# "Day N" numbering, which is a weaker signal, so its messages are warnings.
+
+# DD/MM/YYYY, DD-MM-YYYY or DD.MM.YYYY with one separator throughout, and not
+# part of a longer run of numbers such as "ABG: 7.32/34/88/18"
+NUMERIC_DATE_RE = re.compile(r"(?<![\d./])(\d{1,2})([/.-])(\d{1,2})\2(\d{4})(?![\d./])")
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+NAMED_DATE_RE = re.compile(
+    r"(?<![\d./])(\d{1,2})(?:st|nd|rd|th)?[ -](" + "|".join(m + r"[a-z]*" for m in MONTHS)
+    + r")[ ,-]*(\d{4})(?![\d./])",
+    re.IGNORECASE,
+)
+DAY_RE = re.compile(r"^\s*day\s*[-:]?\s*(\d+)\b", re.IGNORECASE)
+
+UNITS = {
+    "mg": "mg", "mgs": "mg", "gm": "g", "gms": "g", "kg": "kg", "kgs": "kg",
+    "mcg": "mcg", "ug": "mcg", "µg": "mcg", "ml": "ml", "mls": "ml", "cc": "ml",
+    "cm": "cm", "cms": "cm", "iu": "IU", "mmhg": "mmHg", "bpm": "bpm",
+    "g/dl": "g/dL", "gm/dl": "g/dL", "mg/dl": "mg/dL", "mg/l": "mg/L",
+    "mmol/l": "mmol/L", "meq/l": "mEq/L", "iu/l": "IU/L", "u/l": "U/L",
+}
+UNIT_RE = re.compile(
+    r"(\d(?:\.\d+)?)(\s?)(" + "|".join(sorted(map(re.escape, UNITS), key=len, reverse=True)) + r")(?!\w)",
+    re.IGNORECASE,
+)
+
+FREQUENCY_ALIASES = {freq.lower(): freq for freq in FREQUENCIES}
+FREQUENCY_ALIASES.update({"bid": "BD", "tds": "TID", "qds": "QID", "prn": "SOS", "stat": "STAT"})
+FREQUENCY_RE = re.compile(r"\b(" + "|".join(FREQUENCY_ALIASES) + r")\b", re.IGNORECASE)
+
+
+def normalize_text(text):
+    """Trim lines, collapse runs of spaces/blank lines and fix unit spellings."""
+    lines = [" ".join(line.split()) for line in text.strip().splitlines()]
+    text = re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+    return UNIT_RE.sub(lambda m: m.group(1) + m.group(2) + UNITS[m.group(3).lower()], text)
+
+
+def normalize_medications(text):
+    """normalize_text plus upper-case dosing frequencies (tds -> TID, bd -> BD)."""
+    return FREQUENCY_RE.sub(lambda m: FREQUENCY_ALIASES[m.group(1).lower()], normalize_text(text))
+
+
+def parse_date(day, month, year):
+    """Build a date from dd / mm-or-month-name / yyyy parts, or None."""
+    if not month.isdigit():
+        month = MONTHS.index(month[:3].lower()) + 1
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def find_dates(line):
+    """Yield (text, date or None) for every date written in the line."""
+    for match in NUMERIC_DATE_RE.finditer(line):
+        day, _, month, year = match.groups()
+        yield match.group(0), parse_date(day, month, year)
+    for match in NAMED_DATE_RE.finditer(line):
+        yield match.group(0), parse_date(*match.groups())
+
+
+def check_admission_date(admission_date, today=None):
+    today = today or date.today()
+    if admission_date and admission_date > today:
+        return [f"Admission date {admission_date:%d/%m/%Y} is in the future"]
+    return []
+
+
+def check_discharge_date(admission_date, discharge_date):
+    if admission_date and discharge_date and discharge_date < admission_date:
+        return [
+            f"Discharge date {discharge_date:%d/%m/%Y} is before admission date "
+            f"{admission_date:%d/%m/%Y} (duration {(discharge_date - admission_date).days} days)"
+        ]
+    return []
+
+
+def check_dated_lines(text, discharge_date=None, earliest=None, follow_up=False):
+    """Every date must be real and not after discharge (investigations,
+    course) - or, with follow_up=True, not before it. `earliest` also flags
+    dates before admission."""
+    errors = []
+    for number, line in enumerate(text.splitlines(), 1):
+        for written, parsed in find_dates(line):
+            if parsed is None:
+                errors.append(f"Line {number}: '{written}' is not a valid date (use DD/MM/YYYY)")
+            elif follow_up:
+                if discharge_date and parsed < discharge_date:
+                    errors.append(f"Line {number}: follow-up on {written} is before the discharge date")
+            elif discharge_date and parsed > discharge_date:
+                errors.append(f"Line {number}: {written} is after the discharge date")
+            elif earliest and parsed < earliest:
+                errors.append(f"Line {number}: {written} is before the admission date")
+    return errors
+
+
+def check_hospital_course(text, admission_date, discharge_date):
+    """'Day N' lines must start at 1, stay in order and fit inside the stay."""
+    errors = []
+    stay = (discharge_date - admission_date).days if admission_date and discharge_date else None
+    previous = 0
+    for number, line in enumerate(text.splitlines(), 1):
+        match = DAY_RE.match(line)
+        if not match:
+            continue
+        day = int(match.group(1))
+        if day < 1:
+            errors.append(f"Line {number}: day numbering starts at Day 1")
+            continue
+        if stay is not None and stay >= 0 and day > stay + 1:
+            errors.append(f"Line {number}: Day {day} is after discharge (stay is {stay} days)")
+        if day < previous:
+            errors.append(f"Line {number}: Day {day} comes after Day {previous}")
+        previous = max(previous, day)
+    return errors
+